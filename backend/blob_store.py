@@ -0,0 +1,297 @@
+"""
+Content-addressed storage for submitted images and their renditions.
+
+Blobs are keyed by the sha256 of their bytes, so resubmitting the same image
+stores it once. A metadata document per blob in MongoDB acts as the dedupe
+claim and records which renditions (thumbnail, preview) have been generated.
+Renditions are produced by a background worker pool, never on the request path.
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from PIL import Image
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# Rendition name -> longest edge in pixels
+RENDITIONS = {
+    "thumbnail": 256,
+    "preview": 1024,
+}
+
+
+class BlobNotFound(Exception):
+    pass
+
+
+def blob_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def rendition_key(digest: str, rendition: Optional[str] = None) -> str:
+    return f"{digest}.{rendition}" if rendition else digest
+
+
+class LocalBlobBackend:
+    """
+    Stores blobs as files in a sharded directory tree (ab/cd/<key>)
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / key[2:4] / key
+
+    def _write(self, key: str, data: bytes):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _read(self, key: str, start: int, end: Optional[int]) -> bytes:
+        try:
+            with open(self._path(key), 'rb') as f:
+                f.seek(start)
+                return f.read() if end is None else f.read(end - start + 1)
+        except FileNotFoundError:
+            raise BlobNotFound(key)
+
+    async def write(self, key: str, data: bytes):
+        await asyncio.to_thread(self._write, key, data)
+
+    async def read(self, key: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        return await asyncio.to_thread(self._read, key, start, end)
+
+
+class GridFSBlobBackend:
+    """
+    Stores blobs in a GridFS bucket through the application's Motor client, using the key as file id
+    """
+
+    def __init__(self, db, bucket_name: str = "images"):
+        self.db = db
+        self.bucket_name = bucket_name
+        self._bucket = None
+
+    @property
+    def bucket(self) -> AsyncIOMotorGridFSBucket:
+        # Created on first use from the running loop: a bucket made at import time binds Motor to whatever loop exists then
+        if self._bucket is None:
+            self._bucket = AsyncIOMotorGridFSBucket(self.db, bucket_name=self.bucket_name)
+        return self._bucket
+
+    async def write(self, key: str, data: bytes):
+        # Replace semantics, like the local backend: drop any earlier (possibly partial) upload first
+        try:
+            await self.bucket.delete(key)
+        except NoFile:
+            pass
+        await self.bucket.upload_from_stream_with_id(key, key, data)
+
+    async def read(self, key: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        try:
+            grid_out = await self.bucket.open_download_stream(key)
+        except NoFile:
+            raise BlobNotFound(key)
+        grid_out.seek(start)
+        return await grid_out.read(-1 if end is None else end - start + 1)
+
+
+class BlobStore:
+    """
+    Deduplicating blob store with background rendition generation
+    """
+
+    def __init__(self, backend, collection, workers: int = 2, queue_size: int = 256, claim_timeout: float = 300):
+        self.backend = backend
+        self.collection = collection
+        self.workers = workers
+        # An unfinished claim older than this is assumed abandoned (crash or cancelled write) and taken over
+        self.claim_timeout = timedelta(seconds=claim_timeout)
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._pending = set()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks = []
+
+    async def start(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="rendition")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._backfill()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def put(self, data: bytes, content_type: str, digest: Optional[str] = None) -> str:
+        """
+        Store data once under its sha256 and queue its renditions; returns the digest
+        """
+        digest = digest or blob_digest(data)
+        now = datetime.now(timezone.utc)
+        try:
+            await self.collection.insert_one({
+                "_id": digest,
+                "size": len(data),
+                "content_type": content_type,
+                "complete": False,
+                "renditions": {},
+                "created_at": now,
+            })
+        except DuplicateKeyError:
+            doc = await self.collection.find_one({"_id": digest})
+            if doc and doc.get("complete"):
+                if _missing_renditions(doc):
+                    self._enqueue(digest, data)
+                return digest
+            # Take over a claim whose writer never finished; a fresh claim is left to its writer
+            taken = await self.collection.find_one_and_update(
+                {"_id": digest, "complete": False, "created_at": {"$lt": now - self.claim_timeout}},
+                {"$set": {"size": len(data), "content_type": content_type, "created_at": now}}
+            )
+            if not taken:
+                return digest
+            logger.warning(f"Taking over abandoned claim for blob {digest}")
+
+        try:
+            await self.backend.write(rendition_key(digest), data)
+        except Exception:
+            await self.collection.delete_one({"_id": digest})
+            raise
+        await self.collection.update_one({"_id": digest}, {"$set": {"complete": True}})
+
+        self._enqueue(digest, data)
+        return digest
+
+    def _enqueue(self, digest: str, data: bytes):
+        if digest in self._pending:
+            return
+        try:
+            self._queue.put_nowait((digest, data))
+            self._pending.add(digest)
+        except asyncio.QueueFull:
+            logger.warning(f"Rendition queue full, deferring renditions for blob {digest} to the next backfill")
+
+    async def stat(self, digest: str, rendition: Optional[str] = None) -> Tuple[int, str]:
+        """
+        Return (size, content_type) of a stored blob or one of its renditions
+        """
+        doc = await self.collection.find_one({"_id": digest})
+        if not doc or not doc.get("complete"):
+            raise BlobNotFound(digest)
+        if rendition:
+            info = doc.get("renditions", {}).get(rendition)
+            if not info:
+                raise BlobNotFound(rendition_key(digest, rendition))
+            return info["size"], info["content_type"]
+        return doc["size"], doc["content_type"]
+
+    async def read(self, digest: str, rendition: Optional[str] = None, start: int = 0, end: Optional[int] = None) -> bytes:
+        return await self.backend.read(rendition_key(digest, rendition), start, end)
+
+    async def _backfill(self):
+        """
+        Re-queue renditions lost to a full queue or a restart
+        """
+        missing = [{f"renditions.{name}": {"$exists": False}} for name in RENDITIONS]
+        try:
+            async for doc in self.collection.find({"complete": True, "$or": missing}, {"_id": 1}):
+                digest = doc["_id"]
+                if digest in self._pending:
+                    continue
+                try:
+                    data = await self.backend.read(rendition_key(digest))
+                except BlobNotFound:
+                    logger.error(f"Blob {digest} is marked complete but missing from the backend")
+                    continue
+                self._pending.add(digest)
+                await self._queue.put((digest, data))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Rendition backfill failed: {str(e)}")
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            digest, data = await self._queue.get()
+            try:
+                renditions = await loop.run_in_executor(self._executor, render_renditions, data)
+                stored: Dict[str, dict] = {}
+                for name, rendered in renditions.items():
+                    await self.backend.write(rendition_key(digest, name), rendered)
+                    stored[f"renditions.{name}"] = {"size": len(rendered), "content_type": "image/jpeg"}
+                if stored:
+                    await self.collection.update_one({"_id": digest}, {"$set": stored})
+            except Exception as e:
+                logger.error(f"Rendition generation failed for blob {digest}: {str(e)}")
+            finally:
+                self._pending.discard(digest)
+                self._queue.task_done()
+
+
+def _missing_renditions(doc: dict) -> bool:
+    return any(name not in (doc.get("renditions") or {}) for name in RENDITIONS)
+
+
+def render_renditions(data: bytes) -> Dict[str, bytes]:
+    """
+    Produce JPEG renditions of an image; runs in a worker thread
+    """
+    renditions = {}
+    with Image.open(io.BytesIO(data)) as source:
+        source = source.convert("RGB")
+        for name, max_edge in RENDITIONS.items():
+            image = source.copy()
+            image.thumbnail((max_edge, max_edge))
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=85, optimize=True)
+            renditions[name] = buffer.getvalue()
+    return renditions
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single "bytes=" range into inclusive (start, end). Returns None when the
+    whole blob should be served (no header, multi-range or malformed header) and
+    raises ValueError when the range cannot be satisfied.
+    """
+    if not range_header:
+        return None
+    unit, _, spec = range_header.partition('=')
+    first, _, last = spec.strip().partition('-')
+    if unit.strip().lower() != 'bytes' or ',' in spec or not (first or last):
+        return None
+    if (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+    if first:
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        suffix = int(last)
+        if suffix == 0:
+            raise ValueError(range_header)
+        start = max(size - suffix, 0)
+        end = size - 1
+    if start >= size:
+        raise ValueError(range_header)
+    return start, end
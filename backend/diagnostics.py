@@ -0,0 +1,222 @@
+"""
+Runtime diagnostics: an event-loop lag monitor and a low-overhead sampling profiler.
+
+The lag monitor runs a heartbeat coroutine on the loop and a watchdog thread off
+it; when the heartbeat stalls past the threshold the watchdog logs the loop
+thread's current stack, i.e. the callback that is blocking. The profiler samples
+stacks from a background thread into folded ("a;b;c count") format, either for
+a time window across all threads or for a single tagged request's task.
+"""
+import asyncio
+import hmac
+import logging
+import sys
+import threading
+import time
+import traceback
+import uuid
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """
+    Detects callbacks that block the event loop longer than a threshold
+    """
+
+    def __init__(self, threshold: float = 0.1, interval: Optional[float] = None):
+        self.threshold = threshold
+        self.interval = interval or threshold / 2
+        self.stalls = 0
+        self.max_lag = 0.0
+        self.last_lag = 0.0
+        self._beat = time.monotonic()
+        self._reported_beat = None
+        self._loop_thread_id = None
+        self._task = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    async def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.last_lag = max(now - expected, 0.0)
+            self.max_lag = max(self.max_lag, self.last_lag)
+            self._beat = now
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            beat = self._beat
+            blocked = time.monotonic() - beat - self.interval
+            if blocked <= self.threshold or beat == self._reported_beat:
+                continue
+            self._reported_beat = beat
+            self.stalls += 1
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "<unavailable>"
+            logger.warning(f"Event loop blocked for at least {blocked * 1000:.0f}ms, loop thread stack:\n{stack}")
+
+    def stats(self) -> dict:
+        return {
+            "threshold_ms": round(self.threshold * 1000, 1),
+            "last_lag_ms": round(self.last_lag * 1000, 1),
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "stalls": self.stalls,
+        }
+
+
+class Profile:
+    def __init__(self, mode: str, tag: Optional[str] = None, seconds: Optional[float] = None):
+        self.id = uuid.uuid4().hex
+        self.mode = mode
+        self.tag = tag
+        self.seconds = seconds
+        self.started_at = datetime.now(timezone.utc)
+        self.duration = None
+        self.samples = Counter()
+        self.sample_count = 0
+        self.running = True
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "mode": self.mode,
+            "tag": self.tag,
+            "started_at": self.started_at.isoformat(),
+            "duration_seconds": self.duration,
+            "samples": self.sample_count,
+            "status": "running" if self.running else "complete",
+        }
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+def _fold_stack(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    """
+    Stack-sampling profiler; nothing runs unless a profile is active
+    """
+
+    def __init__(self, interval: float = 0.005, keep: int = 20):
+        self.interval = interval
+        self.keep = keep
+        self.profiles: "OrderedDict[str, Profile]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _store(self, profile: Profile):
+        with self._lock:
+            self.profiles[profile.id] = profile
+            while len(self.profiles) > self.keep:
+                self.profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        return self.profiles.get(profile_id)
+
+    def start_window(self, seconds: float) -> Profile:
+        """
+        Sample every thread for a fixed window
+        """
+        profile = Profile("window", seconds=seconds)
+        self._store(profile)
+        stop = threading.Event()
+        threading.Timer(seconds, stop.set).start()
+        threading.Thread(target=self._sample, args=(profile, stop, None, None), name="profiler", daemon=True).start()
+        return profile
+
+    def start_request(self, tag: str) -> "tuple[Profile, threading.Event]":
+        """
+        Sample only while the calling task is running on the loop; set the returned event to finish
+        """
+        profile = Profile("request", tag=tag)
+        self._store(profile)
+        stop = threading.Event()
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+        args = (profile, stop, threading.get_ident(), (loop, task))
+        threading.Thread(target=self._sample, args=args, name="profiler", daemon=True).start()
+        return profile, stop
+
+    def _sample(self, profile: Profile, stop: threading.Event, thread_id: Optional[int], task_filter):
+        started = time.monotonic()
+        own_id = threading.get_ident()
+        while not stop.wait(self.interval):
+            frames = sys._current_frames()
+            if thread_id is not None:
+                loop, task = task_filter
+                try:
+                    if asyncio.current_task(loop) is not task:
+                        continue
+                except RuntimeError:
+                    pass
+                frames = {thread_id: frames.get(thread_id)}
+            for ident, frame in frames.items():
+                if ident == own_id or frame is None:
+                    continue
+                profile.samples[_fold_stack(frame)] += 1
+                profile.sample_count += 1
+        profile.duration = round(time.monotonic() - started, 3)
+        profile.running = False
+
+
+class ProfileRequestMiddleware:
+    """
+    ASGI middleware that profiles a single request tagged with X-Profile-Tag by an admin;
+    the resulting profile id is returned in the X-Profile-Id response header
+    """
+
+    def __init__(self, app, profiler: SamplingProfiler, admin_token: Callable[[], Optional[str]]):
+        self.app = app
+        self.profiler = profiler
+        self.admin_token = admin_token
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or [])
+        tag = headers.get(b"x-profile-tag")
+        token = self.admin_token()
+        supplied = headers.get(b"x-admin-token", b"")
+        if not tag or not token or not hmac.compare_digest(supplied, token.encode()):
+            return await self.app(scope, receive, send)
+
+        profile, stop = self.profiler.start_request(tag.decode("latin-1"))
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile.id.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            stop.set()
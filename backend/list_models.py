@@ -1,13 +1,40 @@
-import google.generativeai as genai
+"""
+Model utilities.
+
+    python list_models.py
+        Write the models that support generateContent to models.txt.
+
+    python list_models.py benchmark --images DIR --models gemini-2.5-flash,gemini-2.0-flash
+        Run a labelled image set through each model with the production prompt and
+        parser and write a machine-readable report. Labels come from DIR/labels.json
+        ({"file.jpg": {"breed": "Gir", "animal_type": "cattle"}}) or, without it,
+        from one sub-directory per breed. --record saves raw responses and --replay
+        answers from them instead of calling the API, so runs can be repeated offline.
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import json
 import os
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import google.generativeai as genai
 from dotenv import load_dotenv
 
 load_dotenv()
 
-api_key = os.environ.get('GOOGLE_API_KEY')
-if not api_key:
-    print("GOOGLE_API_KEY not found in environment.")
-else:
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+
+def list_models():
+    api_key = os.environ.get('GOOGLE_API_KEY')
+    if not api_key:
+        print("GOOGLE_API_KEY not found in environment.")
+        return
     genai.configure(api_key=api_key)
     try:
         with open('models.txt', 'w', encoding='utf-8') as f:
@@ -17,3 +44,216 @@ else:
         print("Models written to models.txt")
     except Exception as e:
         print(f"Error listing models: {e}")
+
+
+def load_labelled_images(image_dir: Path):
+    """
+    Return [(path, label)] from labels.json or a breed-per-directory layout
+    """
+    labels_file = image_dir / "labels.json"
+    if labels_file.exists():
+        with open(labels_file, encoding='utf-8') as f:
+            labels = json.load(f)
+        return [(image_dir / name, label) for name, label in sorted(labels.items())]
+    samples = []
+    for path in sorted(image_dir.rglob("*")):
+        if path.suffix.lower() in IMAGE_EXTENSIONS and path.parent != image_dir:
+            samples.append((path, {"breed": path.parent.name}))
+    return samples
+
+
+def _same_breed(a, b) -> bool:
+    return bool(a) and bool(b) and a.strip().lower() == b.strip().lower()
+
+
+async def _run_model(model_name, samples, catalog, recordings, replay, timeout, concurrency):
+    import server
+    from PIL import Image
+
+    model = None if replay else server.create_recognition_model(catalog, model_name)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(path, label):
+        result = {"image": str(path), "label": label}
+        async with semaphore:
+            try:
+                image_bytes = path.read_bytes()
+                key = f"{model_name}:{hashlib.sha256(image_bytes).hexdigest()}"
+                if replay:
+                    if key not in recordings:
+                        raise KeyError(f"no recorded response for {path.name}")
+                    recorded = recordings[key]
+                else:
+                    # Send the file bytes as-is so latency covers the model, not a local re-encode
+                    with Image.open(io.BytesIO(image_bytes)) as image:
+                        content_type = Image.MIME.get(image.format, "application/octet-stream")
+                    contents = [server.RECOGNITION_PROMPT, server.image_part(image_bytes, content_type)]
+                    started = time.monotonic()
+                    response = await server._generate_content(model, contents, server.Deadline(timeout))
+                    recorded = {
+                        "text": response.text,
+                        "latency_ms": round((time.monotonic() - started) * 1000, 1),
+                        "usage": server.response_usage(response),
+                    }
+                    recordings[key] = recorded
+            except Exception as e:
+                result["error"] = str(e) or type(e).__name__
+                return result
+
+        parsed = server.parse_recognition(recorded["text"], catalog)
+        top3 = [parsed.breed] + [alt.breed for alt in (parsed.alternative_breeds or [])][:2]
+        result.update({
+            "predicted_breed": parsed.breed,
+            "predicted_animal_type": parsed.animal_type,
+            "confidence": parsed.confidence,
+            "latency_ms": recorded["latency_ms"],
+            "usage": recorded.get("usage"),
+            "correct": _same_breed(parsed.breed, label.get("breed")),
+            "top3_hit": any(_same_breed(breed, label.get("breed")) for breed in top3),
+        })
+        if label.get("animal_type"):
+            result["animal_type_correct"] = _same_breed(parsed.animal_type, label["animal_type"])
+        return result
+
+    return await asyncio.gather(*[run_one(path, label) for path, label in samples])
+
+
+def summarize(model_name, results, prices):
+    from server import percentile
+
+    ok = [r for r in results if "error" not in r]
+    latencies = [r["latency_ms"] for r in ok]
+    prompt_tokens = sum((r.get("usage") or {}).get("prompt_tokens", 0) for r in ok)
+    output_tokens = sum((r.get("usage") or {}).get("output_tokens", 0) for r in ok)
+    typed = [r for r in ok if "animal_type_correct" in r]
+
+    cost = None
+    price = prices.get(model_name) or prices.get(model_name.removeprefix("models/"))
+    if price:
+        cost = round(
+            prompt_tokens / 1e6 * price.get("input_per_million", 0)
+            + output_tokens / 1e6 * price.get("output_per_million", 0), 6
+        )
+
+    return {
+        "model": model_name,
+        "images": len(results),
+        "errors": len(results) - len(ok),
+        "accuracy": round(sum(r["correct"] for r in ok) / len(ok), 4) if ok else None,
+        "top3_hit_rate": round(sum(r["top3_hit"] for r in ok) / len(ok), 4) if ok else None,
+        "animal_type_accuracy": round(sum(r["animal_type_correct"] for r in typed) / len(typed), 4) if typed else None,
+        "latency_ms": {pct: percentile(latencies, int(pct[1:])) for pct in ("p50", "p90", "p95", "p99")},
+        "tokens": {
+            "prompt": prompt_tokens,
+            "output": output_tokens,
+            "avg_per_image": round((prompt_tokens + output_tokens) / len(ok), 1) if ok else None,
+        },
+        "estimated_cost_usd": cost,
+        "cost_per_image_usd": round(cost / len(ok), 6) if cost is not None and ok else None,
+    }
+
+
+def _save_recordings(path, recordings):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(recordings, f, indent=2)
+
+
+async def benchmark(args):
+    # The harness never touches the database; a plain URL keeps server import free of SRV DNS lookups
+    os.environ['MONGO_URL'] = 'mongodb://localhost:27017'
+    import server
+
+    samples = load_labelled_images(Path(args.images))
+    if args.limit:
+        samples = samples[:args.limit]
+    if not samples:
+        print(f"No labelled images found in {args.images}")
+        return 1
+
+    if not args.replay and not os.environ.get('GOOGLE_API_KEY'):
+        print("GOOGLE_API_KEY not found in environment; use --replay to run offline.")
+        return 1
+
+    models = [name.strip() for name in args.models.split(',') if name.strip()]
+    catalog = server.get_breed_catalog()
+    # Fill in animal types for labels that only name a catalog breed
+    for _, label in samples:
+        if not label.get("animal_type"):
+            for animal_type, breeds in catalog.breeds.items():
+                if any(_same_breed(info["name"], label.get("breed")) for info in breeds.values()):
+                    label["animal_type"] = animal_type
+    prompt_version = hashlib.sha256(
+        (server.build_system_message(catalog) + server.RECOGNITION_PROMPT).encode('utf-8')
+    ).hexdigest()[:12]
+
+    recordings = {}
+    recordings_path = args.replay or args.record
+    if recordings_path and Path(recordings_path).exists():
+        with open(recordings_path, encoding='utf-8') as f:
+            recordings = json.load(f)
+    prices = {}
+    if args.prices:
+        with open(args.prices, encoding='utf-8') as f:
+            prices = json.load(f)
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "mode": "replay" if args.replay else "live",
+        "prompt_version": prompt_version,
+        "catalog_version": catalog.version,
+        "images": len(samples),
+        "models": [],
+        "results": {},
+    }
+    try:
+        for model_name in models:
+            print(f"Benchmarking {model_name} on {len(samples)} images...")
+            results = await _run_model(model_name, samples, catalog, recordings, bool(args.replay), args.timeout, args.concurrency)
+            report["models"].append(summarize(model_name, results, prices))
+            report["results"][model_name] = results
+            # Paid responses are kept even if a later model aborts the run
+            if args.record:
+                _save_recordings(args.record, recordings)
+    finally:
+        if args.record:
+            _save_recordings(args.record, recordings)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    for summary in report["models"]:
+        print(
+            f"{summary['model']}: accuracy={summary['accuracy']} top3={summary['top3_hit_rate']} "
+            f"p50={summary['latency_ms']['p50']}ms p95={summary['latency_ms']['p95']}ms "
+            f"errors={summary['errors']} cost={summary['estimated_cost_usd']}"
+        )
+    print(f"Report written to {args.output}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List Gemini models or benchmark them on a labelled image set")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("list", help="write models supporting generateContent to models.txt")
+
+    bench = subparsers.add_parser("benchmark", help="benchmark models on a labelled image set")
+    bench.add_argument("--images", required=True, help="directory with labels.json or one sub-directory per breed")
+    bench.add_argument("--models", required=True, help="comma-separated model names, e.g. from models.txt")
+    bench.add_argument("--output", default="benchmark_report.json", help="report path (default: benchmark_report.json)")
+    recording = bench.add_mutually_exclusive_group()
+    recording.add_argument("--record", help="save raw responses to this file for later replay")
+    recording.add_argument("--replay", help="answer from recorded responses instead of calling the API")
+    bench.add_argument("--prices", help='JSON of {"model": {"input_per_million": x, "output_per_million": y}} in USD')
+    bench.add_argument("--limit", type=int, help="only use the first N images")
+    bench.add_argument("--concurrency", type=int, default=4, help="parallel requests per model (default: 4)")
+    bench.add_argument("--timeout", type=float, default=60.0, help="per-image deadline in seconds (default: 60)")
+
+    args = parser.parse_args(argv)
+    if args.command == "benchmark":
+        return asyncio.run(benchmark(args))
+    list_models()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Helpers for live camera feed recognition: near-duplicate frame detection and
+smoothing of per-frame results into a stable track identification.
+"""
+import io
+from collections import Counter, deque
+from typing import Optional
+
+from PIL import Image
+
+# Weight a single observation carries in the track vote, by reported confidence
+CONFIDENCE_WEIGHTS = {
+    "high": 1.0,
+    "medium": 0.6,
+    "low": 0.3,
+}
+
+
+def frame_signature(image: Image.Image, hash_size: int = 8) -> int:
+    """
+    Difference hash of a frame: 64 bits that change little between near-identical frames
+    """
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = small.tobytes()
+    signature = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            signature = (signature << 1) | (left > right)
+    return signature
+
+
+def decode_frame(data: bytes):
+    """
+    Decode a frame for its MIME type and signature; runs in a worker thread.
+    Only the hash needs pixels, the frame itself goes upstream as the received bytes.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        content_type = Image.MIME.get(image.format, "application/octet-stream")
+        return content_type, frame_signature(image)
+
+
+def signature_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class TrackSmoother:
+    """
+    Confidence-weighted vote over the most recent frame results
+    """
+
+    def __init__(self, window: int = 5, stable_share: float = 0.6):
+        self.observations = deque(maxlen=window)
+        self.stable_share = stable_share
+
+    def add(self, breed: Optional[str], animal_type: Optional[str], confidence: Optional[str]) -> dict:
+        if breed and breed != "Unknown":
+            words = (confidence or "").split()
+            level = words[0].strip(",.").lower() if words else "medium"
+            self.observations.append((breed, animal_type, CONFIDENCE_WEIGHTS.get(level, 0.6)))
+        return self.state()
+
+    def state(self) -> dict:
+        votes = Counter()
+        animal_types = {}
+        for breed, animal_type, weight in self.observations:
+            votes[breed] += weight
+            animal_types[breed] = animal_type
+        if not votes:
+            return {"breed": None, "animal_type": None, "stability": 0.0, "stable": False, "observations": 0}
+        breed, score = votes.most_common(1)[0]
+        stability = score / sum(votes.values())
+        return {
+            "breed": breed,
+            "animal_type": animal_types[breed],
+            "stability": round(stability, 2),
+            "stable": len(self.observations) >= 2 and stability >= self.stable_share,
+            "observations": len(self.observations),
+        }
@@ -1,4 +1,5 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Header, Request, Depends, WebSocket, WebSocketDisconnect, BackgroundTasks
+from fastapi.responses import Response, JSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
@@ -11,8 +12,28 @@ import uuid
 from datetime import datetime, timezone
 import base64
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from PIL import Image
 import io
+import json
+import gzip
+import hashlib
+import hmac
+from functools import lru_cache
+import asyncio
+import re
+import time
+import math
+import random
+
+from diagnostics import LoopLagMonitor, SamplingProfiler, ProfileRequestMiddleware
+from live_feed import TrackSmoother, decode_frame, signature_distance
+from blob_store import BlobStore, BlobNotFound, LocalBlobBackend, GridFSBlobBackend, RENDITIONS, blob_digest, parse_range
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always served
+    brotli = None
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -22,6 +43,13 @@ mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ.get('DB_NAME', 'test_database')]
 
+# Image blob store (content-addressed, deduplicated by sha256)
+if os.environ.get('BLOB_BACKEND', 'gridfs') == 'local':
+    blob_backend = LocalBlobBackend(Path(os.environ.get('BLOB_STORE_DIR', ROOT_DIR / 'blobs')))
+else:
+    blob_backend = GridFSBlobBackend(db, bucket_name=os.environ.get('BLOB_BUCKET', 'images'))
+blob_store = BlobStore(blob_backend, db.blobs, workers=int(os.environ.get('RENDITION_WORKERS', '2')))
+
 # Create the main app without a prefix
 app = FastAPI()
 
@@ -35,202 +63,230 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Indian cattle and buffalo breeds database with detailed identification features
-BREED_DATABASE = {
-    "cattle": {
-        "gir": {
-            "name": "Gir",
-            "origin": "Gujarat, India",
-            "utility": "Milch - High milk yield (1400-2500 kg/lactation)",
-            "traits": "Distinctive convex forehead bulge, large pendulous ears, lyre-shaped horns",
-            "color": "Reddish-brown to white, sometimes with white patches",
-            "horn_shape": "Lyre-shaped, curved backward and upward",
-            "size": "Medium to large"
-        },
-        "sahiwal": {
-            "name": "Sahiwal",
-            "origin": "Punjab, India/Pakistan",
-            "utility": "Milch - High milk yield (1400-2500 kg/lactation)",
-            "traits": "Loose skin with prominent dewlap, drooping ears, lyre-shaped horns",
-            "color": "Reddish dun to pale red",
-            "horn_shape": "Lyre-shaped, medium length",
-            "size": "Medium"
-        },
-        "red sindhi": {
-            "name": "Red Sindhi",
-            "origin": "Sindh, Pakistan (now in Indian farms)",
-            "utility": "Milch - High milk fat and protein content",
-            "traits": "Compact body, heat tolerant, red coat, medium build",
-            "color": "Reddish to red",
-            "horn_shape": "Short, thick horns",
-            "size": "Medium"
-        },
-        "tharparkar": {
-            "name": "Tharparkar",
-            "origin": "Rajasthan (Thar Desert), India",
-            "utility": "Dual purpose - Milk (1800-2600 kg/lactation) and draught",
-            "traits": "Lyre-shaped horns, medium to large body, adapted to arid climate",
-            "color": "White to light grey",
-            "horn_shape": "Lyre-shaped, medium length",
-            "size": "Medium to large"
-        },
-        "rathi": {
-            "name": "Rathi",
-            "origin": "Rajasthan, India",
-            "utility": "Milch - Disease resistant, high milk fat",
-            "traits": "Medium-sized, adapted to arid conditions, good body conformation",
-            "color": "Reddish coat",
-            "horn_shape": "Short to medium",
-            "size": "Medium"
-        },
-        "kankrej": {
-            "name": "Kankrej",
-            "origin": "Gujarat-Rajasthan border, India",
-            "utility": "Dual purpose - Draught and milk",
-            "traits": "Large powerful body, lyrate horns, strong draught ability",
-            "color": "Silver grey to iron grey or steel black",
-            "horn_shape": "Lyre-shaped, long and curved",
-            "size": "Large"
-        },
-        "ongole": {
-            "name": "Ongole",
-            "origin": "Andhra Pradesh, India",
-            "utility": "Dual purpose - Draught and beef, good milk yield",
-            "traits": "Large size, prominent hump, white coat, strong and sturdy",
-            "color": "White to light grey",
-            "horn_shape": "Short, thick horns",
-            "size": "Large"
-        },
-        "hariana": {
-            "name": "Hariana",
-            "origin": "Haryana, Uttar Pradesh, India",
-            "utility": "Dual purpose - Milk and draught",
-            "traits": "White to grey coat, medium size, adaptable, good temperament",
-            "color": "White to light grey",
-            "horn_shape": "Small to medium, upward curved",
-            "size": "Medium"
-        },
-        "kangayam": {
-            "name": "Kangayam",
-            "origin": "Tamil Nadu, India",
-            "utility": "Draught and beef - powerful work animal",
-            "traits": "Red color, compact powerful body, grey-black hooves",
-            "color": "Red to dark red",
-            "horn_shape": "Medium, curved backward",
-            "size": "Medium"
-        },
-        "malvi": {
-            "name": "Malvi",
-            "origin": "Madhya Pradesh, India",
-            "utility": "Draught - Strong work capacity",
-            "traits": "White to grey coat, large body, strong build",
-            "color": "White to grey",
-            "horn_shape": "Medium, curved",
-            "size": "Large"
-        },
-        "nagori": {
-            "name": "Nagori",
-            "origin": "Rajasthan, India",
-            "utility": "Draught - Fast moving draught breed",
-            "traits": "White coat, large size, long legs, strong",
-            "color": "White",
-            "horn_shape": "Medium to long, curved",
-            "size": "Large"
-        },
-        "red kandhari": {
-            "name": "Red Kandhari",
-            "origin": "Maharashtra, India",
-            "utility": "Milch - Good milk yield",
-            "traits": "Red coat, strong build, good milk producer",
-            "color": "Red",
-            "horn_shape": "Medium, curved",
-            "size": "Medium"
-        },
-        "khillari": {
-            "name": "Khillari",
-            "origin": "Maharashtra-Karnataka border, India",
-            "utility": "Draught - Fast and powerful",
-            "traits": "Grey-white body, black horns, athletic build",
-            "color": "Grey-white",
-            "horn_shape": "Long, sharp, black horns",
-            "size": "Medium to large"
-        },
-        "hallikar": {
-            "name": "Hallikar",
-            "origin": "Karnataka, India",
-            "utility": "Draught - Agricultural work",
-            "traits": "Grey-white body, black horns, active temperament",
-            "color": "Grey-white",
-            "horn_shape": "Long, sharp, black horns",
-            "size": "Medium"
-        },
-        "amrit mahal": {
-            "name": "Amrit Mahal",
-            "origin": "Karnataka, India",
-            "utility": "Draught - Military transport (historical)",
-            "traits": "White coat, strong and active, good endurance",
-            "color": "White to grey",
-            "horn_shape": "Long, sharp horns",
-            "size": "Medium to large"
-        }
-    },
-    "buffalo": {
-        "murrah": {
-            "name": "Murrah",
-            "origin": "Haryana, Punjab, Delhi, India",
-            "utility": "Premier dairy breed - 2000-2500 kg/lactation",
-            "traits": "Jet black coat, tightly coiled horns, massive body, broad hips, well-developed udder",
-            "color": "Jet black, sometimes white markings on face or tail",
-            "horn_shape": "Short, tightly curled/coiled horns",
-            "size": "Large (Bulls 550-600 kg, Females 450-550 kg)"
-        },
-        "mehsana": {
-            "name": "Mehsana",
-            "origin": "Gujarat (Mehsana district), India",
-            "utility": "High milk yield - good dairy buffalo",
-            "traits": "Black coat, medium-sized, wall-eyed appearance, good udder",
-            "color": "Black",
-            "horn_shape": "Medium, curved backward",
-            "size": "Medium"
-        },
-        "jaffarabadi": {
-            "name": "Jaffarabadi",
-            "origin": "Gujarat (Coastal, Gulf of Khambhat), India",
-            "utility": "Dual purpose - Milk (1500-2000 kg/lactation) and draught",
-            "traits": "Very large massive body, massive dewlap, bulging forehead, broad semi-circular horns",
-            "color": "Black",
-            "horn_shape": "Thick, curved backward and upward forming semi-circle",
-            "size": "Very large (heaviest Indian buffalo breed)"
-        },
-        "surti": {
-            "name": "Surti",
-            "origin": "Gujarat (Kaira and Baroda districts), India",
-            "utility": "Rich milk - High fat content (8-12%), 1000-1300 kg/lactation",
-            "traits": "Medium-sized, sickle-shaped horns, moderately long flat horns",
-            "color": "Silver grey to rusty brown",
-            "horn_shape": "Sickle-shaped, curved like a sickle",
-            "size": "Medium"
-        },
-        "nagpuri": {
-            "name": "Nagpuri",
-            "origin": "Maharashtra (Nagpur region), India",
-            "utility": "Dual purpose - Milk and draught",
-            "traits": "Copper colored coat, medium-sized body, good for farm work",
-            "color": "Copper to black",
-            "horn_shape": "Medium, curved",
-            "size": "Medium"
-        },
-        "banni": {
-            "name": "Banni",
-            "origin": "Gujarat (Banni grasslands, Kutch), India",
-            "utility": "High milk in harsh conditions - Hardy breed",
-            "traits": "Adapted to arid saline regions, medium-sized, good heat tolerance",
-            "color": "Black to grey",
-            "horn_shape": "Medium, curved",
-            "size": "Medium"
-        }
-    }
-}
+# Runtime diagnostics; cheap enough to stay on in production
+loop_lag_monitor = LoopLagMonitor(threshold=float(os.environ.get('LOOP_LAG_THRESHOLD_MS', '100')) / 1000)
+profiler = SamplingProfiler(interval=float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', '5')) / 1000)
+PROFILE_MAX_SECONDS = float(os.environ.get('PROFILE_MAX_SECONDS', '60'))
+
+# Indian cattle and buffalo breeds catalog with detailed identification features.
+# The catalog lives in a versioned data file and is loaded into an immutable
+# snapshot: the /api/breeds payload (plain, gzip and brotli) and the prompt
+# breed list are built once per load instead of once per request.
+BREED_CATALOG_PATH = Path(os.environ.get('BREED_CATALOG_PATH', ROOT_DIR / 'breeds.json'))
+BREEDS_CACHE_CONTROL = os.environ.get('BREEDS_CACHE_CONTROL', 'public, max-age=300, must-revalidate')
+ANIMAL_TYPES = ("cattle", "buffalo")
+ETAG_SUFFIXES = {"gzip": "gz", "br": "br"}
+
+
+class BreedCatalog:
+    """
+    Immutable snapshot of the breed catalog and its precomputed representations
+    """
+
+    def __init__(self, data: dict):
+        self.version = data.get("version")
+        self.breeds = {animal_type: dict(data.get(animal_type, {})) for animal_type in ANIMAL_TYPES}
+
+        payload = {animal_type: list(breeds.values()) for animal_type, breeds in self.breeds.items()}
+        self.body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.encoded = {"gzip": gzip.compress(self.body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.encoded["br"] = brotli.compress(self.body, quality=11)
+        # Strong validators must differ per content-coding, so each encoded body gets its own tag
+        digest = hashlib.sha256(self.body).hexdigest()[:32]
+        self.etag = f'"{digest}"'
+        self.etags = {None: self.etag, **{encoding: f'"{digest}-{ETAG_SUFFIXES[encoding]}"' for encoding in self.encoded}}
+
+        breed_details = []
+        for animal_type, breeds in self.breeds.items():
+            for info in breeds.values():
+                breed_details.append(
+                    f"{info['name']} ({animal_type}): {info['color']}, "
+                    f"{info.get('horn_shape', 'N/A')} horns, {info.get('size', 'medium')} size, "
+                    f"Key traits: {info['traits']}"
+                )
+        self.prompt_details = chr(10).join(breed_details)
+
+    @classmethod
+    def load(cls, path: Path = BREED_CATALOG_PATH) -> "BreedCatalog":
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+
+_breed_catalog = BreedCatalog.load()
+
+
+def get_breed_catalog() -> BreedCatalog:
+    """
+    Return the current catalog snapshot; callers should hold on to it for the whole request
+    """
+    return _breed_catalog
+
+
+def reload_breed_catalog() -> BreedCatalog:
+    """
+    Load the catalog file and swap the snapshot in a single assignment
+    """
+    global _breed_catalog
+    catalog = BreedCatalog.load()
+    _breed_catalog = catalog
+    logger.info(f"Breed catalog reloaded: version {catalog.version}, etag {catalog.etag}")
+    return catalog
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """
+    Guard for admin endpoints - requires ADMIN_TOKEN to be configured and matched
+    """
+    admin_token = os.environ.get('ADMIN_TOKEN')
+    if not admin_token or not x_admin_token or not hmac.compare_digest(x_admin_token, admin_token):
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+
+def _etag_matches(if_none_match: str, etags) -> bool:
+    """
+    Weak comparison of If-None-Match against any of the current representation tags
+    """
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return any(tag.removeprefix('W/') in etags for tag in candidates)
+
+
+def _pick_encoding(accept_encoding: str, available) -> Optional[str]:
+    accepted = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    for coding in ("br", "gzip"):
+        if coding in available and accepted.get(coding, accepted.get("*", 0.0)) > 0:
+            return coding
+    return None
+
+# Request deadlines: budget comes from the X-Request-Timeout header (seconds) or the server default
+REQUEST_TIMEOUT_DEFAULT = float(os.environ.get('REQUEST_TIMEOUT_SECONDS', '30'))
+REQUEST_TIMEOUT_MAX = float(os.environ.get('REQUEST_TIMEOUT_MAX_SECONDS', '120'))
+UPSTREAM_RETRIES = int(os.environ.get('UPSTREAM_RETRIES', '1'))
+RETRYABLE_UPSTREAM_ERRORS = (google_exceptions.ServiceUnavailable, google_exceptions.InternalServerError)
+DISCONNECT_POLL_INTERVAL = 0.25
+
+
+class RequestDeadlineExceeded(Exception):
+    pass
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+class Deadline:
+    """
+    Time budget for one request, shared by every awaited step of it
+    """
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout
+
+    @classmethod
+    def from_header(cls, value: Optional[str]) -> "Deadline":
+        try:
+            timeout = float(value) if value else REQUEST_TIMEOUT_DEFAULT
+        except ValueError:
+            timeout = REQUEST_TIMEOUT_DEFAULT
+        if not math.isfinite(timeout) or timeout <= 0:
+            timeout = REQUEST_TIMEOUT_DEFAULT
+        return cls(min(timeout, REQUEST_TIMEOUT_MAX))
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    async def run(self, awaitable, request: Optional[Request] = None):
+        """
+        Await within the remaining budget; the work is cancelled if the budget runs out or the client disconnects
+        """
+        task = asyncio.ensure_future(awaitable)
+        remaining = self.remaining()
+        if remaining <= 0:
+            task.cancel()
+            raise RequestDeadlineExceeded()
+        watcher = asyncio.create_task(_wait_for_disconnect(request)) if request is not None else None
+        try:
+            done, _ = await asyncio.wait(
+                [t for t in (task, watcher) if t is not None],
+                timeout=remaining,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            if not task.done():
+                task.cancel()
+        if task in done:
+            return task.result()
+        if watcher is not None and watcher in done:
+            raise ClientDisconnected()
+        raise RequestDeadlineExceeded()
+
+
+async def _wait_for_disconnect(request: Request):
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+
+
+async def _generate_content(model, contents, deadline: Deadline, request: Optional[Request] = None):
+    """
+    Call the model within the request deadline, retrying transient upstream errors while budget remains
+    """
+    attempt = 0
+    while True:
+        try:
+            return await deadline.run(
+                model.generate_content_async(contents, request_options={"timeout": max(deadline.remaining(), 1.0)}),
+                request
+            )
+        except RETRYABLE_UPSTREAM_ERRORS as e:
+            attempt += 1
+            if attempt > UPSTREAM_RETRIES or deadline.remaining() < 1.0:
+                raise
+            logger.warning(f"Transient upstream error, retrying ({attempt}/{UPSTREAM_RETRIES}): {str(e)}")
+            await deadline.run(asyncio.sleep(0.5 * attempt), request)
+
+
+def _decode_image(image_base64: str):
+    """
+    Decode and validate an uploaded image; returns (bytes, mime type, sha256)
+    """
+    image_data = base64.b64decode(image_base64)
+    image = Image.open(io.BytesIO(image_data))
+    content_type = Image.MIME.get(image.format, "application/octet-stream")
+    return image_data, content_type, blob_digest(image_data)
+
+
+def image_part(image_data: bytes, content_type: str) -> dict:
+    """
+    Inline blob for the model: the original bytes go upstream as-is, so nothing is re-encoded on the event loop
+    """
+    return {"mime_type": content_type, "data": image_data}
+
+
+# Live camera feed: per-connection recognition rate cap and near-duplicate frame threshold (dHash bits)
+LIVE_FEED_MAX_FPS = float(os.environ.get('LIVE_FEED_MAX_FPS', '1'))
+LIVE_FEED_DEDUPE_DISTANCE = int(os.environ.get('LIVE_FEED_DEDUPE_DISTANCE', '6'))
+
+# Shadow traffic: a sample of primary recognitions is mirrored to candidate models in the background
+SHADOW_MODELS = [name.strip() for name in os.environ.get('SHADOW_MODELS', '').split(',') if name.strip()]
+SHADOW_SAMPLE_RATE = float(os.environ.get('SHADOW_SAMPLE_RATE', '0'))
+SHADOW_MAX_IN_FLIGHT = int(os.environ.get('SHADOW_MAX_IN_FLIGHT', '4'))
+SHADOW_TIMEOUT = float(os.environ.get('SHADOW_TIMEOUT_SECONDS', '60'))
+_shadow_tasks = set()
 
 # Define Models
 class BreedRecognitionRequest(BaseModel):
@@ -260,41 +316,18 @@ class BreedRecognitionResponse(BaseModel):
     breed_info: Optional[BreedInfo] = None
     alternative_breeds: Optional[List[BreedSuggestion]] = None
     image_quality: Optional[str] = None
+    image_hash: Optional[str] = None
     error: Optional[str] = None
 
-@api_router.get("/")
-async def root():
-    return {"message": "Cattle & Buffalo Breed Recognition API"}
+DEFAULT_MODEL = "gemini-2.5-flash"
+RECOGNITION_PROMPT = "Analyze this image carefully and identify the breed. Follow the response format exactly and provide alternative breeds if your confidence is not High."
 
-@api_router.post("/recognize-breed", response_model=BreedRecognitionResponse)
-async def recognize_breed(request: BreedRecognitionRequest):
+@lru_cache(maxsize=4)
+def build_system_message(catalog: BreedCatalog) -> str:
     """
-    Recognize cattle or buffalo breed from an image using Gemini AI with enhanced identification
+    Enhanced system message with detailed breed characteristics, built once per catalog snapshot
     """
-    try:
-        # Get API key from environment
-        api_key = os.environ.get('GOOGLE_API_KEY')
-        if not api_key:
-            raise HTTPException(status_code=500, detail="API key not configured")
-        
-        # Configure Gemini
-        genai.configure(api_key=api_key)
-
-        # Create a unique session ID for this request
-        session_id = str(uuid.uuid4())
-        
-        # Build detailed breed characteristics for AI
-        breed_details = []
-        for animal_type, breeds in BREED_DATABASE.items():
-            for breed_key, info in breeds.items():
-                breed_details.append(
-                    f"{info['name']} ({animal_type}): {info['color']}, "
-                    f"{info.get('horn_shape', 'N/A')} horns, {info.get('size', 'medium')} size, "
-                    f"Key traits: {info['traits']}"
-                )
-        
-        # Prepare enhanced system message with detailed breed characteristics
-        system_message = f"""
+    return f"""
 You are an expert livestock veterinarian specializing in Indian cattle and buffalo breeds with deep knowledge of breed identification.
 
 IDENTIFICATION GUIDELINES:
@@ -307,7 +340,7 @@ IDENTIFICATION GUIDELINES:
    - DISTINCTIVE FEATURES: Forehead bulge, pendulous ears, dewlap, hump, body build
    
 BREED DATABASE WITH IDENTIFICATION FEATURES:
-{chr(10).join(breed_details)}
+{catalog.prompt_details}
 
 RESPONSE FORMAT (MANDATORY):
 Image Quality: [Good/Fair/Poor with brief explanation]
@@ -324,95 +357,183 @@ IMPORTANT:
 - For cross-breeds, mention possible parent breeds
 - If the animal is not clearly visible or not cattle/buffalo, state so clearly
 """
-        
-        # Initialize Gemini model
-        model = genai.GenerativeModel(
-            model_name="gemini-2.5-flash",
-            system_instruction=system_message
-        )
+
+def create_recognition_model(catalog: BreedCatalog, model_name: str = DEFAULT_MODEL):
+    """
+    Configure Gemini and create a model primed with the catalog's system message
+    """
+    api_key = os.environ.get('GOOGLE_API_KEY')
+    if not api_key:
+        raise HTTPException(status_code=500, detail="API key not configured")
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(
+        model_name=model_name,
+        system_instruction=build_system_message(catalog)
+    )
+
+def parse_recognition(response_text: str, catalog: BreedCatalog) -> BreedRecognitionResponse:
+    """
+    Parse the model's formatted answer and resolve breeds against the catalog
+    """
+    animal_type = None
+    breed = None
+    confidence = None
+    image_quality = "Good"
+    alternative_text = ""
+    
+    lines = response_text.split('\n')
+    for line in lines:
+        line = line.strip()
+        if 'Image Quality:' in line:
+            image_quality = line.split(':', 1)[1].strip()
+        elif 'Animal Type:' in line:
+            animal_type = line.split(':', 1)[1].strip().lower()
+        elif 'Primary Breed:' in line or 'Breed:' in line:
+            breed = line.split(':', 1)[1].strip()
+        elif 'Confidence:' in line:
+            confidence = line.split(':', 1)[1].strip()
+        elif 'Alternative Possibilities:' in line or 'Alternative Breeds:' in line:
+            alternative_text = line.split(':', 1)[1].strip()
+    
+    # Get primary breed information from database
+    breed_info = None
+    if animal_type and breed:
+        breed_lower = breed.lower()
+        if animal_type in catalog.breeds:
+            for key, info in catalog.breeds[animal_type].items():
+                if key in breed_lower or breed_lower in key or key.replace(' ', '') in breed_lower.replace(' ', ''):
+                    breed_info = BreedInfo(**info)
+                    breed = info['name']
+                    break
+    
+    # Parse alternative breeds
+    alternative_breeds = []
+    if alternative_text and alternative_text.lower() not in ['none', 'n/a', 'not applicable']:
+        # Try to extract breed names from alternative text
+        alt_parts = alternative_text.split(',')
+        for alt_part in alt_parts[:3]:  # Max 3 alternatives
+            alt_part = alt_part.strip()
+            if alt_part and len(alt_part) > 2:
+                # Try to find breed in database
+                alt_breed_info = None
+                alt_breed_name = None
+                if animal_type and animal_type in catalog.breeds:
+                    for key, info in catalog.breeds[animal_type].items():
+                        if key in alt_part.lower() or info['name'].lower() in alt_part.lower():
+                            alt_breed_info = BreedInfo(**info)
+                            alt_breed_name = info['name']
+                            break
+                
+                if alt_breed_name:
+                    alternative_breeds.append(BreedSuggestion(
+                        breed=alt_breed_name,
+                        confidence="Low to Medium",
+                        reasoning=alt_part,
+                        breed_info=alt_breed_info
+                    ))
+    
+    return BreedRecognitionResponse(
+        success=True,
+        breed=breed or "Unknown",
+        animal_type=animal_type or "unknown",
+        confidence=confidence or "Medium",
+        breed_info=breed_info,
+        alternative_breeds=alternative_breeds if alternative_breeds else None,
+        image_quality=image_quality
+    )
+
+@api_router.get("/")
+async def root():
+    return {"message": "Cattle & Buffalo Breed Recognition API"}
+
+@api_router.post("/recognize-breed", response_model=BreedRecognitionResponse)
+async def recognize_breed(
+    request: BreedRecognitionRequest,
+    http_request: Request,
+    background_tasks: BackgroundTasks,
+    x_request_timeout: Optional[str] = Header(None)
+):
+    """
+    Recognize cattle or buffalo breed from an image using Gemini AI with enhanced identification
+    """
+    deadline = Deadline.from_header(x_request_timeout)
+    session_id = str(uuid.uuid4())
+    image_hash = None
+    try:
+        # Take one catalog snapshot for the whole request
+        catalog = get_breed_catalog()
+        model = create_recognition_model(catalog)
         
         # Process image
         try:
-            image_data = base64.b64decode(request.image_base64)
-            image = Image.open(io.BytesIO(image_data))
+            image_data, content_type, image_hash = await deadline.run(asyncio.to_thread(_decode_image, request.image_base64))
+        except RequestDeadlineExceeded:
+            raise
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Invalid image data: {str(e)}")
         
+        # Keep the image for audit. Storing is detached from the request: the blob is addressed
+        # by its hash, so the response never waits on (or outside the deadline for) the store
+        image = image_part(image_data, content_type)
+        store_task = asyncio.create_task(_store_image(image_data, content_type, image_hash))
+        _store_tasks.add(store_task)
+        store_task.add_done_callback(_store_tasks.discard)
+        
         # Send message and get response
         logger.info(f"Sending breed recognition request for session {session_id}")
         
-        prompt = "Analyze this image carefully and identify the breed. Follow the response format exactly and provide alternative breeds if your confidence is not High."
-        
-        response = await model.generate_content_async([prompt, image])
+        started = time.monotonic()
+        response = await _generate_content(model, [RECOGNITION_PROMPT, image], deadline, http_request)
+        latency_ms = round((time.monotonic() - started) * 1000, 1)
         response_text = response.text
         logger.info(f"Received response: {response_text[:300]}...")
         
-        # Parse the response
-        animal_type = None
-        breed = None
-        confidence = None
-        image_quality = "Good"
-        alternative_text = ""
-        
-        lines = response_text.split('\n')
-        for line in lines:
-            line = line.strip()
-            if 'Image Quality:' in line:
-                image_quality = line.split(':', 1)[1].strip()
-            elif 'Animal Type:' in line:
-                animal_type = line.split(':', 1)[1].strip().lower()
-            elif 'Primary Breed:' in line or 'Breed:' in line:
-                breed = line.split(':', 1)[1].strip()
-            elif 'Confidence:' in line:
-                confidence = line.split(':', 1)[1].strip()
-            elif 'Alternative Possibilities:' in line or 'Alternative Breeds:' in line:
-                alternative_text = line.split(':', 1)[1].strip()
+        result = parse_recognition(response_text, catalog)
+        usage = response_usage(response)
+        result.image_hash = image_hash
         
-        # Get primary breed information from database
-        breed_info = None
-        if animal_type and breed:
-            breed_lower = breed.lower()
-            if animal_type in BREED_DATABASE:
-                for key, info in BREED_DATABASE[animal_type].items():
-                    if key in breed_lower or breed_lower in key or key.replace(' ', '') in breed_lower.replace(' ', ''):
-                        breed_info = BreedInfo(**info)
-                        breed = info['name']
-                        break
+        # Record the recognition, referencing the stored image by hash
+        try:
+            await db.recognitions.insert_one({
+                "id": session_id,
+                "image_hash": result.image_hash,
+                "breed": result.breed,
+                "animal_type": result.animal_type,
+                "confidence": result.confidence,
+                "image_quality": result.image_quality,
+                "raw_response": response_text,
+                "model": DEFAULT_MODEL,
+                "latency_ms": latency_ms,
+                "usage": usage,
+                "outcome": "success",
+                "timestamp": datetime.now(timezone.utc),
+            })
+        except Exception as e:
+            logger.error(f"Failed to save recognition record {session_id}: {str(e)}")
         
-        # Parse alternative breeds
-        alternative_breeds = []
-        if alternative_text and alternative_text.lower() not in ['none', 'n/a', 'not applicable']:
-            # Try to extract breed names from alternative text
-            alt_parts = alternative_text.split(',')
-            for alt_part in alt_parts[:3]:  # Max 3 alternatives
-                alt_part = alt_part.strip()
-                if alt_part and len(alt_part) > 2:
-                    # Try to find breed in database
-                    alt_breed_info = None
-                    alt_breed_name = None
-                    if animal_type and animal_type in BREED_DATABASE:
-                        for key, info in BREED_DATABASE[animal_type].items():
-                            if key in alt_part.lower() or info['name'].lower() in alt_part.lower():
-                                alt_breed_info = BreedInfo(**info)
-                                alt_breed_name = info['name']
-                                break
-                    
-                    if alt_breed_name:
-                        alternative_breeds.append(BreedSuggestion(
-                            breed=alt_breed_name,
-                            confidence="Low to Medium",
-                            reasoning=alt_part,
-                            breed_info=alt_breed_info
-                        ))
+        # Mirroring starts only once the response has been sent
+        background_tasks.add_task(_maybe_shadow, session_id, catalog, image, result, latency_ms, usage)
+        return result
         
-        return BreedRecognitionResponse(
-            success=True,
-            breed=breed or "Unknown",
-            animal_type=animal_type or "unknown",
-            confidence=confidence or "Medium",
-            breed_info=breed_info,
-            alternative_breeds=alternative_breeds if alternative_breeds else None,
-            image_quality=image_quality
+    except (RequestDeadlineExceeded, ClientDisconnected) as e:
+        outcome = "timeout" if isinstance(e, RequestDeadlineExceeded) else "client_disconnected"
+        logger.warning(f"Recognition {session_id} aborted: {outcome} after {deadline.timeout - deadline.remaining():.2f}s of {deadline.timeout:.2f}s budget")
+        try:
+            await db.recognitions.insert_one({
+                "id": session_id,
+                "image_hash": image_hash,
+                "outcome": outcome,
+                "deadline_seconds": deadline.timeout,
+                "timestamp": datetime.now(timezone.utc),
+            })
+        except Exception as db_error:
+            logger.error(f"Failed to save recognition record {session_id}: {str(db_error)}")
+        if outcome == "client_disconnected":
+            # Nobody is listening; nginx-style 499 keeps it distinct in access logs
+            return Response(status_code=499)
+        return JSONResponse(
+            status_code=504,
+            content=BreedRecognitionResponse(success=False, error="Request deadline exceeded").model_dump()
         )
         
     except Exception as e:
@@ -422,15 +543,326 @@ IMPORTANT:
             error=str(e)
         )
 
-@api_router.get("/breeds")
-async def get_breeds():
+def response_usage(response) -> Optional[dict]:
     """
-    Get list of all supported breeds
+    Token usage reported by the model for one response, if any
     """
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return None
     return {
-        "cattle": list(BREED_DATABASE["cattle"].values()),
-        "buffalo": list(BREED_DATABASE["buffalo"].values())
+        "prompt_tokens": getattr(usage, 'prompt_token_count', 0) or 0,
+        "output_tokens": getattr(usage, 'candidates_token_count', 0) or 0,
+        "total_tokens": getattr(usage, 'total_token_count', 0) or 0,
+    }
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))]
+
+def _confidence_level(confidence: Optional[str]) -> Optional[str]:
+    words = (confidence or "").split()
+    return words[0].strip(",.").lower() if words else None
+
+async def _maybe_shadow(session_id, catalog, image: dict, primary: BreedRecognitionResponse, latency_ms: float, usage: Optional[dict]):
+    """
+    Mirror a sampled recognition to the candidate models without awaiting them.
+    `image` is the inline blob already sent to the primary model; SHADOW_MAX_IN_FLIGHT bounds candidate calls.
+    Async so BackgroundTasks runs it on the event loop rather than in a worker thread.
+    """
+    if not SHADOW_MODELS or random.random() >= SHADOW_SAMPLE_RATE:
+        return
+    for model_name in SHADOW_MODELS:
+        if len(_shadow_tasks) >= SHADOW_MAX_IN_FLIGHT:
+            logger.info(f"Shadow traffic saturated, skipping {model_name} for session {session_id}")
+            continue
+        task = asyncio.create_task(_shadow_compare(model_name, session_id, catalog, image, primary, latency_ms, usage))
+        _shadow_tasks.add(task)
+        task.add_done_callback(_shadow_tasks.discard)
+
+async def _shadow_compare(model_name, session_id, catalog, image, primary: BreedRecognitionResponse, latency_ms: float, usage: Optional[dict]):
+    """
+    Run one candidate model on a primary request's image and record latency, usage and agreement
+    """
+    primary_top3 = [primary.breed] + [alt.breed for alt in (primary.alternative_breeds or [])][:2]
+    record = {
+        "recognition_id": session_id,
+        "primary_model": DEFAULT_MODEL,
+        "candidate_model": model_name,
+        "primary_breed": primary.breed,
+        "primary_confidence": primary.confidence,
+        "primary_latency_ms": latency_ms,
+        "primary_usage": usage,
+        "timestamp": datetime.now(timezone.utc),
     }
+    try:
+        model = create_recognition_model(catalog, model_name)
+        started = time.monotonic()
+        response = await _generate_content(model, [RECOGNITION_PROMPT, image], Deadline(SHADOW_TIMEOUT))
+        record["candidate_latency_ms"] = round((time.monotonic() - started) * 1000, 1)
+        candidate = parse_recognition(response.text, catalog)
+        record.update({
+            "candidate_breed": candidate.breed,
+            "candidate_confidence": candidate.confidence,
+            "candidate_usage": response_usage(response),
+            "breed_match": candidate.breed == primary.breed,
+            "animal_type_match": candidate.animal_type == primary.animal_type,
+            "confidence_match": _confidence_level(candidate.confidence) == _confidence_level(primary.confidence),
+            "in_primary_top3": candidate.breed in primary_top3,
+        })
+    except Exception as e:
+        record["error"] = str(e) or type(e).__name__
+    try:
+        await db.shadow_comparisons.insert_one(record)
+    except Exception as e:
+        logger.error(f"Failed to save shadow comparison for {model_name}: {str(e)}")
+
+@api_router.get("/admin/shadow/summary", dependencies=[Depends(require_admin)])
+async def shadow_summary(limit: int = 5000):
+    """
+    Per-candidate latency, token usage and agreement with the primary model over recent shadow comparisons
+    """
+    cursor = db.shadow_comparisons.find({}, {"_id": 0}).sort("timestamp", -1).limit(max(1, min(limit, 50000)))
+    by_model = {}
+    async for record in cursor:
+        by_model.setdefault(record["candidate_model"], []).append(record)
+    
+    summary = []
+    for model_name, records in by_model.items():
+        ok = [r for r in records if not r.get("error")]
+        candidate_latencies = [r["candidate_latency_ms"] for r in ok]
+        primary_latencies = [r["primary_latency_ms"] for r in ok]
+        candidate_tokens = [r["candidate_usage"]["total_tokens"] for r in ok if r.get("candidate_usage")]
+        primary_tokens = [r["primary_usage"]["total_tokens"] for r in ok if r.get("primary_usage")]
+        
+        def rate(field):
+            return round(sum(1 for r in ok if r.get(field)) / len(ok), 3) if ok else None
+        
+        summary.append({
+            "candidate_model": model_name,
+            "primary_model": records[0]["primary_model"],
+            "samples": len(records),
+            "errors": len(records) - len(ok),
+            "breed_agreement": rate("breed_match"),
+            "animal_type_agreement": rate("animal_type_match"),
+            "confidence_agreement": rate("confidence_match"),
+            "top3_agreement": rate("in_primary_top3"),
+            "candidate_latency_ms": {"p50": percentile(candidate_latencies, 50), "p95": percentile(candidate_latencies, 95)},
+            "primary_latency_ms": {"p50": percentile(primary_latencies, 50), "p95": percentile(primary_latencies, 95)},
+            "candidate_avg_tokens": round(sum(candidate_tokens) / len(candidate_tokens), 1) if candidate_tokens else None,
+            "primary_avg_tokens": round(sum(primary_tokens) / len(primary_tokens), 1) if primary_tokens else None,
+        })
+    summary.sort(key=lambda s: (-(s["breed_agreement"] or 0), s["candidate_latency_ms"]["p50"] or float("inf")))
+    return {"sample_rate": SHADOW_SAMPLE_RATE, "candidates": SHADOW_MODELS, "models": summary}
+
+@api_router.websocket("/ws/recognize-feed")
+async def recognize_feed(websocket: WebSocket, fps: Optional[float] = None):
+    """
+    Continuous recognition over a stream of frames (binary image bytes or {"image_base64": ...} text).
+    Near-identical consecutive frames are dropped, at most `fps` frames per second are sent to the
+    model (latest frame wins), and each result is pushed back with a smoothed track identification.
+    """
+    await websocket.accept()
+    max_fps = LIVE_FEED_MAX_FPS
+    if fps and fps > 0:
+        max_fps = min(fps, max_fps) if max_fps > 0 else fps
+    # A non-positive LIVE_FEED_MAX_FPS disables the rate cap; one frame in flight per connection still applies
+    min_interval = 1 / max_fps if max_fps > 0 else 0.0
+    catalog = get_breed_catalog()
+    try:
+        model = create_recognition_model(catalog)
+    except HTTPException as e:
+        await websocket.send_json({"type": "error", "error": e.detail})
+        await websocket.close(code=1011)
+        return
+    
+    smoother = TrackSmoother()
+    stats = {"received": 0, "duplicates": 0, "throttled": 0, "recognized": 0}
+    latest = None
+    frame_ready = asyncio.Event()
+    
+    async def recognize_frames():
+        nonlocal latest
+        next_allowed = 0.0
+        while True:
+            await frame_ready.wait()
+            delay = next_allowed - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            frame_ready.clear()
+            seq, image = latest
+            latest = None
+            next_allowed = time.monotonic() + min_interval
+            try:
+                response = await _generate_content(model, [RECOGNITION_PROMPT, image], Deadline(REQUEST_TIMEOUT_DEFAULT))
+                result = parse_recognition(response.text, catalog)
+            except RequestDeadlineExceeded:
+                await websocket.send_json({"type": "error", "frame": seq, "error": "Frame recognition timed out"})
+                continue
+            except Exception as e:
+                logger.error(f"Error in live feed recognition: {str(e)}")
+                await websocket.send_json({"type": "error", "frame": seq, "error": str(e)})
+                continue
+            stats["recognized"] += 1
+            await websocket.send_json({
+                "type": "result",
+                "frame": seq,
+                "result": result.model_dump(exclude_none=True),
+                "track": smoother.add(result.breed, result.animal_type, result.confidence),
+                "stats": stats,
+            })
+    
+    recognizer = asyncio.create_task(recognize_frames())
+    last_signature = None
+    seq = 0
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            seq += 1
+            stats["received"] += 1
+            try:
+                if message.get("bytes") is not None:
+                    frame_data = message["bytes"]
+                else:
+                    frame_data = base64.b64decode(json.loads(message["text"])["image_base64"])
+                content_type, signature = await asyncio.to_thread(decode_frame, frame_data)
+            except Exception as e:
+                await websocket.send_json({"type": "error", "frame": seq, "error": f"Invalid frame: {str(e)}"})
+                continue
+            
+            if last_signature is not None and signature_distance(signature, last_signature) <= LIVE_FEED_DEDUPE_DISTANCE:
+                stats["duplicates"] += 1
+                continue
+            last_signature = signature
+            if latest is not None:
+                stats["throttled"] += 1
+            latest = (seq, image_part(frame_data, content_type))
+            frame_ready.set()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # Cancels any in-flight upstream call for this connection
+        recognizer.cancel()
+        await asyncio.gather(recognizer, return_exceptions=True)
+
+_store_tasks = set()
+
+async def _store_image(image_data: bytes, content_type: str, image_hash: str) -> Optional[str]:
+    """
+    Store a submitted image in the blob store; failures are logged and never fail recognition
+    """
+    try:
+        return await blob_store.put(image_data, content_type, image_hash)
+    except Exception as e:
+        logger.error(f"Failed to store image {image_hash}: {str(e)}")
+        return None
+
+@api_router.get("/images/{image_hash}")
+async def get_image(image_hash: str, request: Request, rendition: Optional[str] = None):
+    """
+    Serve a stored image or one of its renditions, with single byte-range support
+    """
+    if not re.fullmatch(r"[0-9a-f]{64}", image_hash) or (rendition and rendition not in RENDITIONS):
+        raise HTTPException(status_code=404, detail="Image not found")
+    try:
+        size, content_type = await blob_store.stat(image_hash, rendition)
+        headers = {
+            "Accept-Ranges": "bytes",
+            "ETag": f'"{image_hash}{"." + rendition if rendition else ""}"',
+            "Cache-Control": "public, max-age=31536000, immutable",
+        }
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if byte_range is None:
+            data = await blob_store.read(image_hash, rendition)
+            return Response(content=data, media_type=content_type, headers=headers)
+        start, end = byte_range
+        data = await blob_store.read(image_hash, rendition, start, end)
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        return Response(content=data, status_code=206, media_type=content_type, headers=headers)
+    except BlobNotFound:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+@api_router.get("/breeds")
+async def get_breeds(request: Request):
+    """
+    Get list of all supported breeds, served from the precomputed catalog snapshot
+    """
+    catalog = get_breed_catalog()
+    encoding = _pick_encoding(request.headers.get("accept-encoding", ""), catalog.encoded)
+    headers = {
+        "ETag": catalog.etags[encoding],
+        "Cache-Control": BREEDS_CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+        "X-Catalog-Version": str(catalog.version),
+    }
+    
+    # Any encoding's tag means the client holds the current catalog; the 304 names the variant it would get now
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, catalog.etags.values()):
+        return Response(status_code=304, headers=headers)
+    
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        return Response(content=catalog.encoded[encoding], media_type="application/json", headers=headers)
+    return Response(content=catalog.body, media_type="application/json", headers=headers)
+
+@api_router.post("/admin/breeds/reload", dependencies=[Depends(require_admin)])
+async def reload_breeds():
+    """
+    Hot-reload the breed catalog from its data file without restarting
+    """
+    try:
+        catalog = reload_breed_catalog()
+    except (OSError, ValueError, KeyError) as e:
+        logger.error(f"Breed catalog reload failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Catalog reload failed: {str(e)}")
+    return {"version": catalog.version, "etag": catalog.etag}
+
+@api_router.get("/admin/loop-lag", dependencies=[Depends(require_admin)])
+async def get_loop_lag():
+    """
+    Event-loop lag statistics from the lag monitor
+    """
+    return loop_lag_monitor.stats()
+
+@api_router.post("/admin/profiles", dependencies=[Depends(require_admin)])
+async def start_profile(seconds: float = 10.0):
+    """
+    Start a sampling profile of the whole process for a fixed window
+    """
+    if seconds <= 0 or seconds > PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be between 0 and {PROFILE_MAX_SECONDS}")
+    return profiler.start_window(seconds).summary()
+
+@api_router.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    """
+    List captured profiles, oldest first
+    """
+    return [profile.summary() for profile in list(profiler.profiles.values())]
+
+@api_router.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def download_profile(profile_id: str):
+    """
+    Download a completed profile as folded stacks (flamegraph.pl / speedscope compatible)
+    """
+    profile = profiler.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if profile.running:
+        raise HTTPException(status_code=409, detail="Profile still running")
+    return Response(
+        content=profile.folded(),
+        media_type="text/plain",
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile.id}.folded"'}
+    )
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -443,6 +875,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(ProfileRequestMiddleware, profiler=profiler, admin_token=lambda: os.environ.get('ADMIN_TOKEN'))
+
+@app.on_event("startup")
+async def start_background_services():
+    await blob_store.start()
+    await loop_lag_monitor.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in list(_shadow_tasks) + list(_store_tasks):
+        task.cancel()
+    await loop_lag_monitor.stop()
+    await blob_store.stop()
     client.close()
@@ -0,0 +1,60 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Tests never talk to MongoDB; a plain URL avoids the SRV DNS lookup in backend/.env on import
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("ADMIN_TOKEN", "test-admin-token")
+
+RECOGNITION_TEXT = "Image Quality: Good\nAnimal Type: cattle\nPrimary Breed: Gir\nConfidence: High\n"
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+
+
+class FakeModels:
+    """
+    Stand-in for genai.GenerativeModel. Every call is recorded as (model_name, contents);
+    `text`, `delay` and `broken` (model names that fail to construct) shape the answers.
+    """
+
+    def __init__(self):
+        self.text = RECOGNITION_TEXT
+        self.delay = 0
+        self.broken = set()
+        self.calls = []
+
+    def __call__(self, model_name, **kwargs):
+        if model_name in self.broken:
+            raise RuntimeError(f"{model_name} unavailable")
+        return _FakeModel(self, model_name)
+
+
+class _FakeModel:
+    def __init__(self, models, model_name):
+        self.models = models
+        self.model_name = model_name
+
+    async def generate_content_async(self, contents, request_options=None):
+        self.models.calls.append((self.model_name, contents))
+        await asyncio.sleep(self.models.delay)
+        return FakeResponse(self.models.text)
+
+
+@pytest.fixture
+def fake_models(monkeypatch):
+    import server
+
+    models = FakeModels()
+    monkeypatch.setenv("GOOGLE_API_KEY", "test-key")
+    monkeypatch.setattr(server.genai, "GenerativeModel", models)
+    return models
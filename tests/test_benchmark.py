@@ -0,0 +1,101 @@
+import hashlib
+import io
+import json
+
+import pytest
+from PIL import Image
+
+import list_models
+
+
+def _response_text(breed, animal_type, alternatives="None"):
+    return (
+        f"Image Quality: Good\nAnimal Type: {animal_type}\nPrimary Breed: {breed}\n"
+        f"Confidence: Medium\nAlternative Possibilities: {alternatives}\n"
+    )
+
+
+def _write_image(path, color):
+    Image.new("RGB", (16, 16), color).save(path, "PNG")
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+@pytest.fixture
+def replay_fixture(tmp_path):
+    images = tmp_path / "images"
+    images.mkdir()
+    labels = {
+        "gir.png": {"breed": "Gir"},
+        "murrah.png": {"breed": "Murrah", "animal_type": "buffalo"},
+        "sahiwal.png": {"breed": "Sahiwal"},
+        "missing.png": {"breed": "Ongole"},
+    }
+    (images / "labels.json").write_text(json.dumps(labels))
+    recordings = {}
+    answers = {
+        "gir.png": ("red", _response_text("Gir", "cattle"), 100),
+        "murrah.png": ("black", _response_text("Nagpuri", "buffalo", "Murrah, Mehsana"), 200),
+        "sahiwal.png": ("orange", _response_text("Tharparkar", "cattle", "Kankrej"), 400),
+    }
+    for name, (color, text, latency) in answers.items():
+        digest = _write_image(images / name, color)
+        recordings[f"m1:{digest}"] = {
+            "text": text,
+            "latency_ms": latency,
+            "usage": {"prompt_tokens": 1000, "output_tokens": 50, "total_tokens": 1050},
+        }
+    recordings_path = tmp_path / "recordings.json"
+    recordings_path.write_text(json.dumps(recordings))
+    prices_path = tmp_path / "prices.json"
+    prices_path.write_text(json.dumps({"m1": {"input_per_million": 1.0, "output_per_million": 10.0}}))
+    return tmp_path, images, recordings_path, prices_path
+
+
+def test_replay_report_metrics(replay_fixture):
+    tmp_path, images, recordings_path, prices_path = replay_fixture
+    output = tmp_path / "report.json"
+    exit_code = list_models.main([
+        "benchmark", "--images", str(images), "--models", "m1",
+        "--replay", str(recordings_path), "--prices", str(prices_path), "--output", str(output),
+    ])
+    assert exit_code == 0
+
+    report = json.loads(output.read_text())
+    assert report["mode"] == "replay"
+    summary = report["models"][0]
+    assert summary["images"] == 4
+    assert summary["errors"] == 1
+    assert summary["accuracy"] == round(1 / 3, 4)
+    assert summary["top3_hit_rate"] == round(2 / 3, 4)
+    assert summary["animal_type_accuracy"] == 1.0
+    assert summary["latency_ms"] == {"p50": 200, "p90": 400, "p95": 400, "p99": 400}
+    assert summary["tokens"] == {"prompt": 3000, "output": 150, "avg_per_image": 1050.0}
+    assert summary["estimated_cost_usd"] == 0.0045
+
+    missing = next(r for r in report["results"]["m1"] if r["image"].endswith("missing.png"))
+    assert "error" in missing
+
+
+def test_summarize_without_successes():
+    summary = list_models.summarize("m2", [{"image": "a.png", "label": {}, "error": "boom"}], {})
+    assert summary["errors"] == 1
+    assert summary["accuracy"] is None
+    assert summary["latency_ms"]["p50"] is None
+    assert summary["estimated_cost_usd"] is None
+
+
+def test_record_sends_blobs_and_keeps_recordings_when_a_model_fails(replay_fixture, fake_models):
+    tmp_path, images, _, _ = replay_fixture
+    fake_models.text = _response_text("Gir", "cattle")
+    fake_models.broken.add("broken")
+    record_path = tmp_path / "recorded.json"
+    with pytest.raises(RuntimeError):
+        list_models.main([
+            "benchmark", "--images", str(images), "--models", "live,broken",
+            "--record", str(record_path), "--output", str(tmp_path / "out.json"),
+        ])
+
+    recorded = json.loads(record_path.read_text())
+    assert len(recorded) == 3 and all(key.startswith("live:") for key in recorded)
+    images_sent = [contents[1] for _, contents in fake_models.calls]
+    assert all(part["mime_type"] == "image/png" and isinstance(part["data"], bytes) for part in images_sent)
@@ -0,0 +1,218 @@
+import asyncio
+import io
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+from PIL import Image
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError
+
+import blob_store
+from blob_store import BlobNotFound, BlobStore, GridFSBlobBackend, LocalBlobBackend, RENDITIONS, blob_digest, parse_range
+
+
+def _get(doc, path):
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return None, False
+        doc = doc[part]
+    return doc, True
+
+
+def _matches(doc, query):
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(_matches(doc, sub) for sub in condition):
+                return False
+            continue
+        value, present = _get(doc, key)
+        if isinstance(condition, dict) and any(op.startswith("$") for op in condition):
+            for op, operand in condition.items():
+                if op == "$lt" and not (present and value < operand):
+                    return False
+                if op == "$exists" and present != operand:
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeCollection:
+    """
+    Just enough of a Motor collection for BlobStore
+    """
+
+    def __init__(self):
+        self.docs = {}
+
+    async def insert_one(self, doc):
+        if doc["_id"] in self.docs:
+            raise DuplicateKeyError("duplicate")
+        self.docs[doc["_id"]] = dict(doc)
+
+    async def find_one(self, query):
+        return next((dict(d) for d in self.docs.values() if _matches(d, query)), None)
+
+    async def find_one_and_update(self, query, update):
+        doc = next((d for d in self.docs.values() if _matches(d, query)), None)
+        if doc:
+            self._apply(doc, update)
+        return doc
+
+    async def update_one(self, query, update):
+        doc = next((d for d in self.docs.values() if _matches(d, query)), None)
+        if doc:
+            self._apply(doc, update)
+
+    async def delete_one(self, query):
+        self.docs.pop(query["_id"], None)
+
+    def find(self, query, projection=None):
+        async def cursor():
+            for doc in list(self.docs.values()):
+                if _matches(doc, query):
+                    yield doc
+        return cursor()
+
+    @staticmethod
+    def _apply(doc, update):
+        for key, value in update["$set"].items():
+            target = doc
+            *parents, leaf = key.split(".")
+            for part in parents:
+                target = target.setdefault(part, {})
+            target[leaf] = value
+
+
+def _png(color="red"):
+    buffer = io.BytesIO()
+    Image.new("RGB", (400, 300), color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BlobStore(LocalBlobBackend(tmp_path), FakeCollection())
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("bytes=0-9", (0, 9)),
+    ("bytes=90-", (90, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=-500", (0, 99)),
+    ("bytes=50-5000", (50, 99)),
+    ("bytes=0-1,5-6", None),
+    ("bytes=9-3", None),
+    ("bytes=a-b", None),
+    ("items=0-9", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 100) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=150-200", "bytes=-0"])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(ValueError):
+        parse_range(header, 100)
+
+
+def test_put_dedupes_and_generates_renditions(store):
+    async def scenario():
+        await store.start()
+        data = _png()
+        first = await store.put(data, "image/png")
+        second = await store.put(data, "image/png")
+        await store._queue.join()
+        await store.stop()
+        return data, first, second
+
+    data, first, second = asyncio.run(scenario())
+    assert first == second == blob_digest(data)
+    assert set(store.collection.docs[first]["renditions"]) == set(RENDITIONS)
+
+
+def test_put_takes_over_abandoned_claim(store):
+    data = _png()
+    digest = blob_digest(data)
+    store.collection.docs[digest] = {
+        "_id": digest, "size": len(data), "content_type": "image/png", "complete": False, "renditions": {},
+        "created_at": datetime.now(timezone.utc) - timedelta(hours=1),
+    }
+
+    async def scenario():
+        await store.put(data, "image/png")
+        return await store.stat(digest), await store.read(digest)
+
+    (size, _), stored = asyncio.run(scenario())
+    assert store.collection.docs[digest]["complete"] is True
+    assert size == len(data) and stored == data
+
+
+def test_put_leaves_fresh_claim_to_its_writer(store):
+    data = _png()
+    digest = blob_digest(data)
+    store.collection.docs[digest] = {
+        "_id": digest, "size": len(data), "content_type": "image/png", "complete": False, "renditions": {},
+        "created_at": datetime.now(timezone.utc),
+    }
+    asyncio.run(store.put(data, "image/png"))
+    assert store.collection.docs[digest]["complete"] is False
+    with pytest.raises(BlobNotFound):
+        asyncio.run(store.read(digest))
+
+
+def test_duplicate_put_requeues_missing_renditions(store):
+    data = _png()
+
+    async def scenario():
+        digest = await store.put(data, "image/png")
+        # Lost before a worker picked it up, e.g. a restart
+        store._queue = asyncio.Queue()
+        store._pending.clear()
+        await store.put(data, "image/png")
+        return digest, store._queue.qsize()
+
+    digest, queued = asyncio.run(scenario())
+    assert queued == 1 and digest in store._pending
+
+
+def test_start_backfills_missing_renditions(store):
+    data = _png("blue")
+
+    async def scenario():
+        digest = await store.put(data, "image/png")
+        store._queue = asyncio.Queue()
+        store._pending.clear()
+        await store.start()
+        for _ in range(100):
+            if set(store.collection.docs[digest]["renditions"]) == set(RENDITIONS):
+                break
+            await asyncio.sleep(0.02)
+        await store.stop()
+        return digest
+
+    digest = asyncio.run(scenario())
+    assert set(store.collection.docs[digest]["renditions"]) == set(RENDITIONS)
+
+
+def test_gridfs_bucket_binds_to_the_loop_that_uses_it():
+    backend = GridFSBlobBackend(AsyncIOMotorClient("mongodb://localhost:27017").test_database)
+    assert backend._bucket is None
+
+    async def scenario():
+        return backend.bucket.get_io_loop() is asyncio.get_running_loop()
+
+    assert asyncio.run(scenario())
+
+
+def test_server_imports_after_an_earlier_event_loop():
+    # asyncio.run() leaves no current loop behind; import must not need one
+    code = "import asyncio; asyncio.run(asyncio.sleep(0)); import server"
+    env = {**os.environ, "MONGO_URL": "mongodb://localhost:27017"}
+    result = subprocess.run([sys.executable, "-c", code], cwd=Path(blob_store.__file__).parent, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
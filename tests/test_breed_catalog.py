@@ -0,0 +1,95 @@
+import gzip
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from server import _etag_matches, _pick_encoding
+
+ETAG = '"abc123"'
+ETAGS = {ETAG, '"abc123-gz"'}
+
+
+@pytest.fixture
+def client():
+    return TestClient(server.app)
+
+
+def test_etag_matches_strong_weak_list_and_star():
+    assert _etag_matches(ETAG, ETAGS)
+    assert _etag_matches('"abc123-gz"', ETAGS)
+    assert _etag_matches(f'W/{ETAG}', ETAGS)
+    assert _etag_matches(f'"other", {ETAG}', ETAGS)
+    assert _etag_matches("*", ETAGS)
+    assert not _etag_matches('"other"', ETAGS)
+
+
+def test_pick_encoding_prefers_brotli_and_honours_q_zero():
+    available = {"br": b"", "gzip": b""}
+    assert _pick_encoding("gzip, br", available) == "br"
+    assert _pick_encoding("br;q=0, gzip", available) == "gzip"
+    assert _pick_encoding("gzip;q=0", available) is None
+    assert _pick_encoding("*", {"gzip": b""}) == "gzip"
+    assert _pick_encoding("*;q=0", available) is None
+    assert _pick_encoding("", available) is None
+    assert _pick_encoding("identity", available) is None
+
+
+def test_breeds_served_from_snapshot_with_cache_headers(client):
+    catalog = server.get_breed_catalog()
+    response = client.get("/api/breeds", headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.headers["etag"] == catalog.etag
+    assert response.headers["cache-control"] == server.BREEDS_CACHE_CONTROL
+    assert "content-encoding" not in response.headers
+    assert set(response.json()) == {"cattle", "buffalo"}
+
+
+def test_breeds_gzip_body_matches_plain(client):
+    catalog = server.get_breed_catalog()
+    assert json.loads(gzip.decompress(catalog.encoded["gzip"])) == json.loads(catalog.body)
+    response = client.get("/api/breeds", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == catalog.etags["gzip"]
+
+
+def test_breeds_etag_differs_per_encoding():
+    catalog = server.get_breed_catalog()
+    assert len(set(catalog.etags.values())) == len(catalog.encoded) + 1
+    assert catalog.etags[None] == catalog.etag
+
+
+@pytest.mark.parametrize("if_none_match", ["{etag}", "W/{etag}", "*", '"stale", {etag}'])
+def test_breeds_not_modified(client, if_none_match):
+    etag = server.get_breed_catalog().etag
+    response = client.get("/api/breeds", headers={
+        "If-None-Match": if_none_match.format(etag=etag),
+        "Accept-Encoding": "identity",
+    })
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+
+def test_breeds_not_modified_names_the_negotiated_variant(client):
+    catalog = server.get_breed_catalog()
+    response = client.get("/api/breeds", headers={"If-None-Match": catalog.etags["gzip"], "Accept-Encoding": "gzip"})
+    assert response.status_code == 304
+    assert response.headers["etag"] == catalog.etags["gzip"]
+    # A tag for another coding still proves the client holds the current catalog
+    response = client.get("/api/breeds", headers={"If-None-Match": catalog.etag, "Accept-Encoding": "gzip"})
+    assert response.status_code == 304
+    assert response.headers["etag"] == catalog.etags["gzip"]
+
+
+def test_breeds_stale_etag_gets_full_body(client):
+    response = client.get("/api/breeds", headers={"If-None-Match": '"stale"'})
+    assert response.status_code == 200
+
+
+def test_reload_requires_admin(client):
+    assert client.post("/api/admin/breeds/reload").status_code == 403
+    response = client.post("/api/admin/breeds/reload", headers={"X-Admin-Token": "test-admin-token"})
+    assert response.status_code == 200
+    assert response.json()["etag"] == server.get_breed_catalog().etag
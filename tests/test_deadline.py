@@ -0,0 +1,119 @@
+import asyncio
+import base64
+import io
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import server
+from server import Deadline, RequestDeadlineExceeded
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, server.REQUEST_TIMEOUT_DEFAULT),
+    ("", server.REQUEST_TIMEOUT_DEFAULT),
+    ("soon", server.REQUEST_TIMEOUT_DEFAULT),
+    ("0", server.REQUEST_TIMEOUT_DEFAULT),
+    ("-3", server.REQUEST_TIMEOUT_DEFAULT),
+    ("nan", server.REQUEST_TIMEOUT_DEFAULT),
+    ("inf", server.REQUEST_TIMEOUT_DEFAULT),
+    ("-inf", server.REQUEST_TIMEOUT_DEFAULT),
+    ("2.5", 2.5),
+    ("100000", server.REQUEST_TIMEOUT_MAX),
+])
+def test_from_header_parses_and_clamps(value, expected):
+    assert Deadline.from_header(value).timeout == expected
+
+
+def test_run_returns_result_within_budget():
+    async def scenario():
+        return await Deadline(1).run(asyncio.sleep(0, result="done"))
+
+    assert asyncio.run(scenario()) == "done"
+
+
+def test_run_cancels_work_when_budget_runs_out():
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def scenario():
+        with pytest.raises(RequestDeadlineExceeded):
+            await Deadline(0.05).run(slow())
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert cancelled == [True]
+
+
+def test_run_rejects_spent_budget():
+    async def scenario():
+        deadline = Deadline(0)
+        with pytest.raises(RequestDeadlineExceeded):
+            await deadline.run(asyncio.sleep(0))
+
+    asyncio.run(scenario())
+
+
+class _Recognitions:
+    def __init__(self):
+        self.docs = []
+
+    async def insert_one(self, doc):
+        self.docs.append(doc)
+
+
+@pytest.fixture
+def recognition_env(fake_models, monkeypatch):
+    recognitions = _Recognitions()
+
+    async def store_image(image_data, content_type, image_hash):
+        return image_hash
+
+    monkeypatch.setattr(server.db, "recognitions", recognitions, raising=False)
+    monkeypatch.setattr(server, "_store_image", store_image)
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), "red").save(buffer, "JPEG")
+    body = {"image_base64": base64.b64encode(buffer.getvalue()).decode()}
+    return recognitions, body, buffer.getvalue()
+
+
+def test_recognition_sends_original_bytes_upstream(recognition_env, fake_models):
+    recognitions, body, jpeg = recognition_env
+    response = TestClient(server.app).post("/api/recognize-breed", json=body)
+    assert response.json()["breed"] == "Gir"
+    assert fake_models.calls[0][1][1] == {"mime_type": "image/jpeg", "data": jpeg}
+    assert recognitions.docs[-1]["outcome"] == "success"
+
+
+def test_recognition_times_out_with_distinct_outcome(recognition_env, fake_models):
+    recognitions, body, _ = recognition_env
+    fake_models.delay = 5
+    response = TestClient(server.app).post("/api/recognize-breed", json=body, headers={"X-Request-Timeout": "0.2"})
+    assert response.status_code == 504
+    assert response.json()["error"] == "Request deadline exceeded"
+    assert recognitions.docs[-1]["outcome"] == "timeout"
+
+
+def test_recognition_does_not_wait_for_image_store(recognition_env, monkeypatch):
+    recognitions, body, jpeg = recognition_env
+    stored = []
+
+    async def slow_store(image_data, content_type, image_hash):
+        stored.append(image_hash)
+        await asyncio.sleep(30)
+
+    monkeypatch.setattr(server, "_store_image", slow_store)
+    started = time.monotonic()
+    response = TestClient(server.app).post("/api/recognize-breed", json=body, headers={"X-Request-Timeout": "2"})
+    assert time.monotonic() - started < 2
+    assert response.status_code == 200
+    assert response.json()["image_hash"] == stored[0] == server.blob_digest(jpeg)
+    assert recognitions.docs[-1]["image_hash"] == stored[0]
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from diagnostics import LoopLagMonitor, Profile, SamplingProfiler
+
+ADMIN = {"X-Admin-Token": "test-admin-token"}
+
+
+def _busy(seconds):
+    until = time.monotonic() + seconds
+    while time.monotonic() < until:
+        pass
+
+
+def _wait_until_complete(profile, timeout=2.0):
+    until = time.monotonic() + timeout
+    while profile.running and time.monotonic() < until:
+        time.sleep(0.01)
+    assert not profile.running
+
+
+def test_lag_monitor_reports_blocking_callback(caplog):
+    def blocking_callback():
+        time.sleep(0.3)
+
+    async def scenario():
+        monitor = LoopLagMonitor(threshold=0.05)
+        await monitor.start()
+        await asyncio.sleep(0.1)
+        blocking_callback()
+        await asyncio.sleep(0.1)
+        await monitor.stop()
+        return monitor
+
+    with caplog.at_level(logging.WARNING, logger="diagnostics"):
+        monitor = asyncio.run(scenario())
+
+    assert monitor.stalls == 1
+    assert monitor.stats()["max_lag_ms"] >= 200
+    assert "blocking_callback" in caplog.text
+
+
+def test_lag_monitor_quiet_loop_has_no_stalls():
+    async def scenario():
+        monitor = LoopLagMonitor(threshold=0.05)
+        await monitor.start()
+        await asyncio.sleep(0.2)
+        await monitor.stop()
+        return monitor
+
+    assert asyncio.run(scenario()).stalls == 0
+
+
+def test_window_profile_samples_all_threads():
+    profiler = SamplingProfiler(interval=0.001)
+    profile = profiler.start_window(0.2)
+    _busy(0.3)
+    _wait_until_complete(profile)
+    assert profile.sample_count > 0
+    assert "_busy (test_diagnostics.py" in profile.folded()
+
+
+def test_request_profile_samples_only_its_task():
+    profiler = SamplingProfiler(interval=0.001)
+
+    def tagged_work():
+        _busy(0.1)
+
+    def other_work():
+        _busy(0.1)
+
+    async def other_task():
+        await asyncio.sleep(0)
+        other_work()
+
+    async def scenario():
+        profile, stop = profiler.start_request("tagged")
+        tagged_work()
+        # Runs on the loop while the tagged task is suspended; must not be sampled
+        await asyncio.create_task(other_task())
+        stop.set()
+        return profile
+
+    profile = asyncio.run(scenario())
+    _wait_until_complete(profile)
+    assert profile.mode == "request" and profile.tag == "tagged"
+    assert "tagged_work" in profile.folded()
+    assert "other_work" not in profile.folded()
+
+
+def test_profiler_keeps_only_recent_profiles():
+    profiler = SamplingProfiler(keep=2)
+    profiles = [Profile("window") for _ in range(3)]
+    for profile in profiles:
+        profiler._store(profile)
+    assert list(profiler.profiles) == [profiles[1].id, profiles[2].id]
+    assert profiler.get(profiles[0].id) is None
+
+
+@pytest.fixture
+def client():
+    return TestClient(server.app)
+
+
+@pytest.mark.parametrize("headers", [{}, {"X-Admin-Token": "wrong"}])
+def test_profile_tag_requires_admin_token(client, headers):
+    response = client.get("/api/", headers={"X-Profile-Tag": "slow", **headers})
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
+
+
+def test_admin_tagged_request_is_profiled(client):
+    response = client.get("/api/", headers={"X-Profile-Tag": "slow", **ADMIN})
+    profile = server.profiler.get(response.headers["x-profile-id"])
+    assert profile.mode == "request" and profile.tag == "slow"
+    _wait_until_complete(profile)
+
+
+def test_download_profile_not_found_running_and_complete(client, monkeypatch):
+    monkeypatch.setattr(server, "profiler", SamplingProfiler())
+    assert client.get("/api/admin/profiles/missing", headers=ADMIN).status_code == 404
+
+    profile = Profile("window", seconds=1)
+    profile.samples["main (app.py:1);work (app.py:5)"] = 3
+    server.profiler._store(profile)
+    assert client.get(f"/api/admin/profiles/{profile.id}", headers=ADMIN).status_code == 409
+
+    profile.running = False
+    response = client.get(f"/api/admin/profiles/{profile.id}", headers=ADMIN)
+    assert response.status_code == 200
+    assert response.text == "main (app.py:1);work (app.py:5) 3\n"
+    assert client.get(f"/api/admin/profiles/{profile.id}").status_code == 403
+
+
+@pytest.mark.parametrize("seconds", [0, -1, server.PROFILE_MAX_SECONDS + 1])
+def test_start_profile_rejects_out_of_range_window(client, seconds):
+    response = client.post("/api/admin/profiles", params={"seconds": seconds}, headers=ADMIN)
+    assert response.status_code == 400
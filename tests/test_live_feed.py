@@ -0,0 +1,87 @@
+import io
+
+from fastapi.testclient import TestClient
+from PIL import Image, ImageDraw
+
+import server
+from live_feed import TrackSmoother, decode_frame, frame_signature, signature_distance
+
+
+def _frame(split=32, speck=False, fmt="PNG"):
+    image = Image.new("RGB", (64, 64), "black")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([0, 0, split, 63], fill="white")
+    if speck:
+        image.putpixel((60, 60), (128, 128, 128))
+    buffer = io.BytesIO()
+    image.save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def test_signature_distance():
+    assert signature_distance(0b1011, 0b1011) == 0
+    assert signature_distance(0b1011, 0b0010) == 2
+
+
+def test_near_identical_frames_are_within_dedupe_threshold():
+    base = frame_signature(Image.open(io.BytesIO(_frame())))
+    speck = frame_signature(Image.open(io.BytesIO(_frame(speck=True))))
+    moved = frame_signature(Image.open(io.BytesIO(_frame(split=8))))
+    assert signature_distance(base, speck) <= server.LIVE_FEED_DEDUPE_DISTANCE
+    assert signature_distance(base, moved) > server.LIVE_FEED_DEDUPE_DISTANCE
+
+
+def test_decode_frame_reports_mime_type():
+    content_type, _ = decode_frame(_frame(fmt="JPEG"))
+    assert content_type == "image/jpeg"
+
+
+def test_track_smoother_weights_by_confidence():
+    smoother = TrackSmoother(window=5)
+    smoother.add("Gir", "cattle", "Low")
+    state = smoother.add("Sahiwal", "cattle", "High")
+    assert state["breed"] == "Sahiwal"
+    state = smoother.add("Gir", "cattle", "Low")
+    assert state["breed"] == "Sahiwal"
+    assert state["stability"] == round(1.0 / 1.6, 2)
+
+
+def test_track_smoother_becomes_stable_and_ignores_unknown():
+    smoother = TrackSmoother(window=5, stable_share=0.6)
+    assert not smoother.add("Murrah", "buffalo", "High")["stable"]
+    state = smoother.add("Murrah", "buffalo", "Medium - coiled horns")
+    assert state["stable"] and state["stability"] == 1.0
+    state = smoother.add("Unknown", "unknown", "Low")
+    assert state["observations"] == 2
+
+
+def test_track_smoother_window_evicts_old_observations():
+    smoother = TrackSmoother(window=2)
+    smoother.add("Gir", "cattle", "High")
+    smoother.add("Surti", "buffalo", "High")
+    state = smoother.add("Surti", "buffalo", "High")
+    assert state["breed"] == "Surti" and state["stability"] == 1.0
+
+
+def test_feed_drops_duplicates_and_sends_raw_bytes(fake_models, monkeypatch):
+    monkeypatch.setattr(server, "LIVE_FEED_MAX_FPS", 0)
+    frame = _frame()
+    with TestClient(server.app).websocket_connect("/api/ws/recognize-feed") as ws:
+        ws.send_bytes(frame)
+        first = ws.receive_json()
+        ws.send_bytes(_frame(speck=True))
+        ws.send_bytes(_frame(split=8))
+        second = ws.receive_json()
+
+    assert first["type"] == "result" and first["frame"] == 1
+    assert first["track"]["breed"] == "Gir"
+    assert second["frame"] == 3
+    assert second["stats"]["duplicates"] == 1
+    assert fake_models.calls[0][1][1] == {"mime_type": "image/png", "data": frame}
+
+
+def test_feed_reports_invalid_frames(fake_models):
+    with TestClient(server.app).websocket_connect("/api/ws/recognize-feed") as ws:
+        ws.send_bytes(b"not an image")
+        message = ws.receive_json()
+    assert message["type"] == "error" and message["frame"] == 1
@@ -0,0 +1,91 @@
+import asyncio
+import base64
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import server
+
+
+class _Collection:
+    def __init__(self, fake_models):
+        self.fake_models = fake_models
+        self.docs = []
+        self.calls_at_insert = []
+
+    async def insert_one(self, doc):
+        self.calls_at_insert.append(len(self.fake_models.calls))
+        self.docs.append(doc)
+
+
+@pytest.fixture
+def shadow_env(fake_models, monkeypatch):
+    async def store_image(image_data, content_type, image_hash):
+        return image_hash
+
+    async def no_op():
+        pass
+
+    recognitions = _Collection(fake_models)
+    comparisons = _Collection(fake_models)
+    monkeypatch.setattr(server.db, "recognitions", recognitions, raising=False)
+    monkeypatch.setattr(server.db, "shadow_comparisons", comparisons, raising=False)
+    monkeypatch.setattr(server, "_store_image", store_image)
+    # Lifespan keeps the loop alive for the mirrored calls; the blob store would wait on a real MongoDB
+    monkeypatch.setattr(server.blob_store, "start", no_op)
+    monkeypatch.setattr(server.blob_store, "stop", no_op)
+    monkeypatch.setattr(server, "SHADOW_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(server, "SHADOW_MODELS", ["cand-a", "cand-b", "cand-c"])
+    monkeypatch.setattr(server, "SHADOW_MAX_IN_FLIGHT", 2)
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), "red").save(buffer, "JPEG")
+    body = {"image_base64": base64.b64encode(buffer.getvalue()).decode()}
+    return recognitions, comparisons, body, buffer.getvalue()
+
+
+async def _drain_shadow_tasks():
+    await asyncio.gather(*list(server._shadow_tasks))
+
+
+def test_recognition_mirrors_to_candidates_after_primary_is_recorded(shadow_env, fake_models):
+    recognitions, comparisons, body, jpeg = shadow_env
+
+    with TestClient(server.app) as client:
+        response = client.post("/api/recognize-breed", json=body)
+        client.portal.call(_drain_shadow_tasks)
+
+    assert response.json()["breed"] == "Gir"
+    # Only the primary call had been made when the recognition was recorded
+    assert recognitions.calls_at_insert == [1]
+    assert [name for name, _ in fake_models.calls] == [server.DEFAULT_MODEL, "cand-a", "cand-b"]
+    assert all(contents[1] == {"mime_type": "image/jpeg", "data": jpeg} for _, contents in fake_models.calls)
+    assert sorted(r["candidate_model"] for r in comparisons.docs) == ["cand-a", "cand-b"]
+    recognition_id = recognitions.docs[0]["id"]
+    assert all(r["recognition_id"] == recognition_id and r["breed_match"] for r in comparisons.docs)
+
+
+def test_shadow_in_flight_cap_counts_candidate_calls(shadow_env, fake_models):
+    _, comparisons, _, jpeg = shadow_env
+    image = server.image_part(jpeg, "image/jpeg")
+    primary = server.parse_recognition(fake_models.text, server.get_breed_catalog())
+
+    async def scenario():
+        await server._maybe_shadow("session", server.get_breed_catalog(), image, primary, 12.5, None)
+        scheduled = len(server._shadow_tasks)
+        await _drain_shadow_tasks()
+        return scheduled
+
+    assert asyncio.run(scenario()) == 2
+    assert sorted(r["candidate_model"] for r in comparisons.docs) == ["cand-a", "cand-b"]
+    assert all(r["breed_match"] and r["primary_latency_ms"] == 12.5 for r in comparisons.docs)
+    assert all(contents[1] == image for _, contents in fake_models.calls)
+
+
+def test_percentile():
+    assert server.percentile([], 50) is None
+    assert server.percentile([5, 1, 3], 50) == 3
+    assert server.percentile(list(range(1, 101)), 95) == 95
+    assert server.percentile([7], 99) == 7